@@ -1,24 +1,116 @@
 #!/usr/bin/env python3
 import os
-import glob
-import json
 import logging
+import multiprocessing
 import sys
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener
+import orjson
 from pdf_extractor import PDFOutlineExtractor
 
-# Configure logging for Docker (stdout)
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[logging.StreamHandler(sys.stdout)]
-)
 logger = logging.getLogger(__name__)
 
-def main():
+# Pretty-printed UTF-8 JSON; naive datetimes are serialized as UTC
+JSON_OPTIONS = orjson.OPT_INDENT_2 | orjson.OPT_NAIVE_UTC
+
+# Per-worker extractor, created by _init_worker
+_EXTRACTOR = None
+
+def setup_logging():
+    """Configure logging for Docker (stdout) through a queue drained by a background thread."""
+    log_queue = multiprocessing.Queue(-1)
+    
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(
+        logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    )
+    listener = QueueListener(log_queue, stream_handler)
+    
+    _attach_queue_handler(log_queue)
+    listener.start()
+    return log_queue, listener
+
+def _attach_queue_handler(log_queue):
+    """Route this process's log records to the shared queue."""
+    root = logging.getLogger()
+    root.handlers[:] = [QueueHandler(log_queue)]
+    root.setLevel(logging.INFO)
+
+def _init_worker(log_queue):
+    """Pool initializer: set up logging and one extractor reused for every task."""
+    global _EXTRACTOR
+    _attach_queue_handler(log_queue)
+    # Built here, not in the parent: parser state must not cross process boundaries
+    _EXTRACTOR = PDFOutlineExtractor()
+
+def process_one(pdf_path):
+    """Extract the outline of a single PDF; runs inside a worker process."""
+    filename = os.path.basename(pdf_path)
+    try:
+        logger.info(f"Processing: {filename}")
+        
+        result = _EXTRACTOR.extract_outline(pdf_path)
+        
+        # Prepare output
+        output_data = {
+            "filename": filename,
+            "title": result.get("title", "Document"),
+            "outline": result.get("outline", []),
+            "total_headings": len(result.get("outline", [])),
+            "processing_status": "success"
+        }
+        return {"status": "success", "filename": filename, "output_data": output_data}
+        
+    except Exception as e:
+        return {"status": "error", "filename": filename, "error": str(e)}
+
+def _write_json(path, data):
+    """Serialize data and write it straight to a file descriptor, bypassing Python's io stack."""
+    payload = memoryview(orjson.dumps(data, option=JSON_OPTIONS))
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        while payload:
+            payload = payload[os.write(fd, payload):]
+    finally:
+        os.close(fd)
+
+def write_result(res, output_dir, run_ts):
+    """Write a worker result to the output directory; returns True on success."""
+    filename = res["filename"]
+    
+    if res["status"] == "success":
+        output_data = {"timestamp": run_ts, **res["output_data"]}
+        output_file = os.path.join(output_dir, os.path.splitext(filename)[0] + '.json')
+        try:
+            _write_json(output_file, output_data)
+            logger.info(f"✅ Generated: {os.path.basename(output_file)} ({output_data['total_headings']} headings)")
+            return True
+        except Exception as e:
+            res = {"status": "error", "filename": filename, "error": str(e)}
+    
+    logger.error(f"❌ Error processing {filename}: {res['error']}")
+    
+    # Create error output file
+    try:
+        error_output = {
+            "timestamp": run_ts,
+            "filename": filename,
+            "processing_status": "error",
+            "error_message": res["error"]
+        }
+        error_file = os.path.join(output_dir, f"ERROR_{os.path.splitext(filename)[0]}.json")
+        _write_json(error_file, error_output)
+    except Exception as write_error:
+        logger.error(f"Failed to write error file: {write_error}")
+    return False
+
+def main(log_queue):
     """Main processing function with comprehensive error handling."""
     input_dir = "/app/input"
     output_dir = "/app/output"
+    # One timestamp for the whole batch keeps outputs of a run consistent
+    run_ts = datetime.utcnow()
     
     # Ensure directories exist
     try:
@@ -28,17 +120,26 @@ def main():
         logger.error(f"Failed to create output directory: {e}")
         return 1
     
-    # Initialize extractor
-    try:
-        extractor = PDFOutlineExtractor()
-        logger.info("PDF extractor initialized successfully")
-    except Exception as e:
-        logger.error(f"Failed to initialize PDF extractor: {e}")
-        return 1
-    
     # Find PDF files
     try:
-        pdf_files = glob.glob(os.path.join(input_dir, "*.pdf"))
+        with os.scandir(input_dir) as entries:
+            pdf_entries = [e for e in entries if e.is_file() and e.name.lower().endswith('.pdf')]
+        
+        # Names differing only in extension case (x.pdf, x.PDF) would write the same output file
+        output_stems = {}
+        skipped_count = 0
+        for entry in sorted(pdf_entries, key=lambda e: e.name):
+            stem = os.path.splitext(entry.name)[0]
+            if stem in output_stems:
+                logger.error(f"❌ Skipping {entry.name}: output name clashes with {output_stems[stem].name}")
+                skipped_count += 1
+                continue
+            output_stems[stem] = entry
+        pdf_entries = list(output_stems.values())
+        
+        # Largest files first so the pool isn't left waiting on one big file at the end
+        pdf_entries.sort(key=lambda e: e.stat().st_size, reverse=True)
+        pdf_files = [e.path for e in pdf_entries]
         logger.info(f"Found {len(pdf_files)} PDF files in {input_dir}")
         
         if not pdf_files:
@@ -48,67 +149,42 @@ def main():
         logger.error(f"Error scanning input directory: {e}")
         return 1
     
-    # Process each PDF
-    processed_count = 0
-    error_count = 0
+    # Process PDFs in parallel; results are written by a thread pool in the parent
+    # so disk writes overlap with collecting the next parsed result
+    processes = min(os.cpu_count() or 1, len(pdf_files))
+    logger.info(f"Processing with {processes} worker(s)")
     
-    for pdf_path in pdf_files:
-        try:
-            filename = os.path.basename(pdf_path)
-            logger.info(f"Processing: {filename}")
-            
-            # Extract outline
-            result = extractor.extract_outline(pdf_path)
-            
-            # Prepare output
-            output_data = {
-                "timestamp": datetime.utcnow().isoformat(),
-                "filename": filename,
-                "title": result.get("title", "Document"),
-                "outline": result.get("outline", []),
-                "total_headings": len(result.get("outline", [])),
-                "processing_status": "success"
-            }
-            
-            # Write JSON output
-            base_name = os.path.basename(pdf_path)
-            output_file = os.path.join(output_dir, base_name.replace('.pdf', '.json'))
-            
-            with open(output_file, 'w', encoding='utf-8') as f:
-                json.dump(output_data, f, indent=2, ensure_ascii=False)
-            
-            logger.info(f"✅ Generated: {os.path.basename(output_file)} ({len(result.get('outline', []))} headings)")
-            processed_count += 1
-            
-        except Exception as e:
-            logger.error(f"❌ Error processing {os.path.basename(pdf_path)}: {str(e)}")
-            error_count += 1
-            
-            # Create error output file
-            try:
-                error_output = {
-                    "timestamp": datetime.utcnow().isoformat(),
-                    "filename": os.path.basename(pdf_path),
-                    "processing_status": "error",
-                    "error_message": str(e)
-                }
-                error_file = os.path.join(output_dir, f"ERROR_{os.path.basename(pdf_path).replace('.pdf', '.json')}")
-                with open(error_file, 'w', encoding='utf-8') as f:
-                    json.dump(error_output, f, indent=2, ensure_ascii=False)
-            except Exception as write_error:
-                logger.error(f"Failed to write error file: {write_error}")
+    with ThreadPoolExecutor(max_workers=2) as writer:
+        with multiprocessing.Pool(processes=processes, initializer=_init_worker,
+                                  initargs=(log_queue,)) as pool:
+            futures = [
+                writer.submit(write_result, res, output_dir, run_ts)
+                for res in pool.imap_unordered(process_one, pdf_files, chunksize=1)
+            ]
+            # Let workers exit on their own: Pool.__exit__ terminates them, which can
+            # kill one mid-write to the log queue and hang listener.stop()
+            pool.close()
+            pool.join()
+        # Workers have exited; leaving this block waits for the pending writes
+    
+    processed_count = sum(1 for f in futures if f.result())
+    error_count = len(futures) - processed_count + skipped_count
     
     # Summary
     logger.info(f"Processing complete: {processed_count} successful, {error_count} errors")
     return 0 if error_count == 0 else 1
 
 if __name__ == "__main__":
+    log_queue, listener = setup_logging()
     try:
-        exit_code = main()
-        sys.exit(exit_code)
+        exit_code = main(log_queue)
     except KeyboardInterrupt:
         logger.info("Processing interrupted by user")
-        sys.exit(130)
+        exit_code = 130
     except Exception as e:
         logger.exception(f"Unexpected error: {e}")
-        sys.exit(1)
+        exit_code = 1
+    
+    # Flush queued records before exiting
+    listener.stop()
+    sys.exit(exit_code)
@@ -1,12 +1,33 @@
-import pdfplumber
-from pypdf import PdfReader
-from statistics import median
+import pymupdf
+from array import array
+import heapq
+import numpy as np
 import re
 import logging
-from typing import Dict, List
+from typing import Dict, List, NamedTuple, Tuple
 
 logger = logging.getLogger(__name__)
 
+# Precompiled patterns used on every extracted span
+_WS_RE = re.compile(r'\s+')
+_CTRL_RE = re.compile(r'[\x00-\x1f\x7f-\x9f]')
+_HEADING_RE = re.compile(
+    r'^(chapter|section|part)\s+\d+'
+    r'|^(introduction|conclusion|summary|abstract)'
+    r'|^\d+\.\s+\w+'
+)
+
+# Heading levels, indexed by the codes from _classify_heading_levels
+_LEVEL_NAMES = ("H1", "H2", "H3")
+
+class Heading(NamedTuple):
+    """A single outline entry; converted to a dict when the outline is returned."""
+    level: str
+    text: str
+    page: int
+    font_size: float
+    is_bold: bool
+
 class PDFOutlineExtractor:
     """Enhanced PDF outline extractor with robust error handling."""
     
@@ -18,17 +39,17 @@ class PDFOutlineExtractor:
         logger.debug(f"Starting extraction for: {pdf_path}")
         
         try:
-            with pdfplumber.open(pdf_path) as pdf:
-                if not pdf.pages:
+            with pymupdf.open(pdf_path) as doc:
+                if doc.page_count == 0:
                     logger.warning(f"PDF has no pages: {pdf_path}")
                     return {"title": "Empty Document", "outline": []}
                 
                 # Extract title
-                self.outline_data["title"] = self._extract_title(pdf_path, pdf)
+                self.outline_data["title"] = self._extract_title(doc)
                 
                 # Extract headings
-                headings = self._extract_headings(pdf)
-                self.outline_data["outline"] = headings
+                headings = self._extract_headings(doc)
+                self.outline_data["outline"] = [h._asdict() for h in headings]
                 
                 logger.debug(f"Extracted {len(headings)} headings from {pdf_path}")
                 return self.outline_data.copy()
@@ -37,16 +58,13 @@ class PDFOutlineExtractor:
             logger.error(f"Failed to process PDF {pdf_path}: {e}")
             raise
 
-    def _extract_title(self, pdf_path: str, pdf) -> str:
+    def _extract_title(self, doc) -> str:
         """Extract title with multiple fallback methods."""
-        # Try metadata first
+        # Try metadata first (already parsed by the open document)
         try:
-            reader = PdfReader(pdf_path)
-            if (reader.metadata and 
-                hasattr(reader.metadata, 'title') and 
-                reader.metadata.title and 
-                reader.metadata.title.strip()):
-                title = reader.metadata.title.strip()
+            md = doc.metadata or {}
+            title = (md.get("Title") or md.get("title") or "").strip()
+            if title:
                 logger.debug(f"Title from metadata: {title}")
                 return title
         except Exception as e:
@@ -54,25 +72,24 @@ class PDFOutlineExtractor:
         
         # Fallback to first page analysis
         try:
-            title = self._guess_title_from_content(pdf)
+            title = self._guess_title_from_content(doc)
             logger.debug(f"Title from content: {title}")
             return title
         except Exception as e:
             logger.debug(f"Content title extraction failed: {e}")
             return "Document"
 
-    def _guess_title_from_content(self, pdf) -> str:
+    def _guess_title_from_content(self, doc) -> str:
         """Guess title from first page content."""
         try:
-            first_page = pdf.pages[0]
-            words = first_page.extract_words(extra_attrs=["size"])
+            spans = [s for s in self._iter_spans(doc[0]) if s["text"].strip()]
             
-            if not words:
+            if not spans:
                 return "Document"
             
             # Find largest font size
-            max_size = max(w["size"] for w in words)
-            candidates = [w for w in words if w["size"] >= max_size * 0.95]
+            max_size = max(s["size"] for s in spans)
+            candidates = [s for s in spans if s["size"] >= max_size * 0.95]
             
             if candidates:
                 candidates.sort(key=lambda x: (-x["size"], -len(x["text"])))
@@ -84,145 +101,141 @@ class PDFOutlineExtractor:
         
         return "Document"
 
-    def _extract_headings(self, pdf) -> List[Dict]:
+    def _iter_spans(self, page):
+        """Yield text spans (runs of uniform font) from a page."""
+        for block in page.get_text("dict", flags=pymupdf.TEXTFLAGS_TEXT)["blocks"]:
+            for line in block.get("lines", []):
+                yield from line["spans"]
+
+    def _extract_headings(self, doc) -> List[Heading]:
         """Extract headings using statistical font analysis."""
         try:
-            # Collect font sizes for statistical analysis
-            all_sizes = []
-            for page_num, page in enumerate(pdf.pages):
-                try:
-                    for char in page.chars:
-                        if isinstance(char.get("size"), (int, float)):
-                            all_sizes.append(round(char["size"], 1))
-                except Exception as e:
-                    logger.debug(f"Error processing page {page_num + 1}: {e}")
-                    continue
+            # Single pass: collect font sizes and heading candidates together. Every page
+            # has to be read, since the median that decides which pages could hold
+            # headings is only known once all of them have been seen
+            span_sizes = array("d")
+            span_lengths = array("l")
+            candidates = []
+            for page_no, page in enumerate(doc, 1):
+                candidates.extend(self._collect_page_candidates(page, page_no, span_sizes, span_lengths))
             
-            if not all_sizes:
+            # Quantize once and weight each span by its character count
+            rounded_sizes = np.round(np.asarray(span_sizes), 1)
+            all_sizes = np.repeat(rounded_sizes, np.asarray(span_lengths))
+            if not all_sizes.size:
                 logger.warning("No font size data found")
                 return []
             
-            median_size = median(all_sizes)
+            median_size = float(np.median(all_sizes))
             logger.debug(f"Median font size: {median_size}")
             
-            # Extract headings
+            # Candidates reference their span; use the same quantized size as the median
+            size_list = rounded_sizes.tolist()
+            candidates = [
+                (text, size_list[span_index], is_bold, page_no)
+                for text, span_index, is_bold, page_no in candidates
+            ]
+            
+            # Classify all candidates against the document median at once
+            levels = self._classify_heading_levels(candidates, median_size)
             headings = []
-            for page_no, page in enumerate(pdf.pages, 1):
-                try:
-                    page_headings = self._extract_page_headings(page, page_no, median_size)
-                    headings.extend(page_headings)
-                except Exception as e:
-                    logger.debug(f"Error processing headings on page {page_no}: {e}")
-                    continue
+            for (text, size, is_bold, page_no), level in zip(candidates, levels):
+                if level < 0:
+                    # No size/bold signal: fall back to text patterns
+                    if not self._is_heading_pattern(text):
+                        continue
+                    level = 2
+                headings.append(Heading(_LEVEL_NAMES[level], text, page_no, size, is_bold))
             
-            # Remove duplicates and limit results
+            # Remove duplicates and keep the most prominent headings
             unique_headings = self._deduplicate_headings(headings)
-            return unique_headings[:50]  # Limit to 50 headings
+            return self._top_headings(unique_headings, 50)  # Limit to 50 headings
             
         except Exception as e:
             logger.error(f"Heading extraction failed: {e}")
             return []
 
-    def _extract_page_headings(self, page, page_no: int, median_size: float) -> List[Dict]:
-        """Extract headings from a single page."""
-        headings = []
+    def _collect_page_candidates(self, page, page_no: int, span_sizes: array,
+                                 span_lengths: array) -> List[Tuple]:
+        """Record a page's span sizes and return its (text, span_index, is_bold, page) candidates."""
+        candidates = []
         
+        # One handler per page: a failure keeps what was collected before it
         try:
-            words = page.extract_words(
-                extra_attrs=["size", "fontname"], 
-                keep_blank_chars=False
-            )
-            
-            for word in words:
-                try:
-                    text = self._clean_text(word.get("text", ""))
-                    if len(text) < 3 or text.isdigit() or not text.strip():
-                        continue
-
-                    size = round(word.get("size", 0), 1)
-                    font = word.get("fontname", "").lower()
-                    is_bold = "bold" in font
-
-                    # Classify heading level
-                    level = self._classify_heading_level(size, median_size, is_bold, text)
-                    
-                    if level:
-                        headings.append({
-                            "level": level,
-                            "text": text,
-                            "page": page_no,
-                            "font_size": size,
-                            "is_bold": is_bold
-                        })
-                        
-                except Exception as e:
-                    logger.debug(f"Error processing word: {e}")
+            for span in self._iter_spans(page):
+                raw_size = span.get("size")
+                if not isinstance(raw_size, (int, float)):
+                    continue
+                raw = span.get("text", "")
+                span_sizes.append(raw_size)
+                span_lengths.append(len(raw))
+                
+                # Cheap filters first so most spans never reach the regex cleanup
+                if len(raw) < 3 or raw.isdigit() or not raw.strip():
+                    continue
+                
+                text = self._clean_text(raw)
+                if len(text) < 3 or text.isdigit():
                     continue
+
+                font = span.get("font", "").lower()
+                is_bold = bool(span.get("flags", 0) & pymupdf.TEXT_FONT_BOLD) or "bold" in font
+                
+                candidates.append((text, len(span_sizes) - 1, is_bold, page_no))
                     
         except Exception as e:
-            logger.debug(f"Error extracting words from page {page_no}: {e}")
+            logger.debug(f"Error extracting spans from page {page_no}: {e}")
         
-        return headings
+        return candidates
 
-    def _classify_heading_level(self, size: float, median_size: float, is_bold: bool, text: str) -> str:
-        """Classify heading level based on size and formatting."""
-        try:
-            if size >= median_size * 1.6:
-                return "H1"
-            elif size >= median_size * 1.3:
-                return "H2"
-            elif size >= median_size * 1.1 or is_bold:
-                return "H3"
-            elif self._is_heading_pattern(text):
-                return "H3"
-            return None
-        except Exception:
-            return None
+    def _classify_heading_levels(self, candidates: List[Tuple], median_size: float) -> List[int]:
+        """Classify candidates by size and formatting; returns indexes into _LEVEL_NAMES, -1 for none."""
+        count = len(candidates)
+        sizes = np.fromiter((c[1] for c in candidates), dtype=np.float64, count=count)
+        bold = np.fromiter((c[2] for c in candidates), dtype=bool, count=count)
+        
+        levels = np.select(
+            [sizes >= median_size * 1.6, sizes >= median_size * 1.3, (sizes >= median_size * 1.1) | bold],
+            [0, 1, 2],
+            default=-1
+        )
+        return levels.tolist()
 
     def _is_heading_pattern(self, text: str) -> bool:
         """Detect common heading patterns."""
-        try:
-            patterns = [
-                r'^(chapter|section|part)\s+\d+',
-                r'^(introduction|conclusion|summary|abstract)',
-                r'^\d+\.\s+\w+',
-                r'^[A-Z][A-Z\s]{3,}$'  # ALL CAPS (minimum 4 chars)
-            ]
-            
-            text_lower = text.lower()
-            for pattern in patterns:
-                if re.match(pattern, text_lower):
-                    return True
-            return False
-        except Exception:
-            return False
-
-    def _deduplicate_headings(self, headings: List[Dict]) -> List[Dict]:
-        """Remove duplicate headings."""
-        try:
-            unique_headings = []
-            seen = set()
-            
-            for heading in headings:
-                key = f"{heading['text']}_{heading['page']}"
-                if key not in seen and len(heading['text'].strip()) > 0:
-                    seen.add(key)
-                    unique_headings.append(heading)
-            
-            return unique_headings
-        except Exception as e:
-            logger.debug(f"Deduplication failed: {e}")
+        # ALL CAPS (minimum 4 chars): cheap string checks before the regex
+        if len(text) >= 4 and text[0].isalpha() and text.isupper() and text.replace(' ', '').isalpha():
+            return True
+        return _HEADING_RE.match(text.lower()) is not None
+
+    def _top_headings(self, headings: List[Heading], limit: int) -> List[Heading]:
+        """Keep the largest-font headings (earliest first on ties), in document order."""
+        if len(headings) <= limit:
             return headings
+        # nsmallest keeps a bounded heap instead of sorting every heading
+        keep = heapq.nsmallest(limit, range(len(headings)), key=lambda i: (-headings[i].font_size, i))
+        return [headings[i] for i in sorted(keep)]
+
+    def _deduplicate_headings(self, headings: List[Heading]) -> List[Heading]:
+        """Remove duplicate headings."""
+        unique_headings = []
+        seen = set()
+        
+        # Text is already cleaned and non-empty by the time it gets here
+        for heading in headings:
+            key = (heading.text, heading.page)
+            if key not in seen:
+                seen.add(key)
+                unique_headings.append(heading)
+        
+        return unique_headings
 
     def _clean_text(self, text: str) -> str:
         """Clean and normalize extracted text."""
-        try:
-            if not text:
-                return ""
-            # Remove excessive whitespace and clean up
-            cleaned = re.sub(r'\s+', ' ', str(text)).strip()
-            # Remove control characters
-            cleaned = re.sub(r'[\x00-\x1f\x7f-\x9f]', '', cleaned)
-            return cleaned
-        except Exception:
-            return str(text) if text else ""
+        if not text:
+            return ""
+        # Remove excessive whitespace and clean up
+        cleaned = _WS_RE.sub(' ', str(text)).strip()
+        # Remove control characters
+        cleaned = _CTRL_RE.sub('', cleaned)
+        return cleaned